@@ -6,82 +6,153 @@
 #   pip install pycryptodomex
 # Documentation for PyCryptodome
 #   https://pycryptodome.readthedocs.io/en/latest/
+# gmpy2 is used for faster big integer arithmetic when it is installed
+#   pip install gmpy2
 
 from Cryptodome.Random import random
 from Cryptodome.Util import number
+from dataclasses import dataclass
 
-# Modular exponentiation using square-and-multiply method
+try:
+    from gmpy2 import mpz, powmod
+except ImportError:
+    # Without gmpy2 the built-in integers give the same results, only slower
+    mpz, powmod = int, pow
+
+# Random integer for exponents and group elements
 #
-# a: base
-# x: exponent
-# p: modulus
-# returns (a^x) mod p computed using O(log p) steps
-#
-def power(a, x, p):
-    res = 1
-    a = a % p
-    if a == 0:
-        return 0
-    while x > 0:
-        # Square if exponent is even
-        if (x & 1) == 0:
-            a = (a * a) % p
-            x = x >> 1
-        # Multiply if exponent is odd
-        else:
-            res = (res * a) % p
-            x = x - 1
-    return res
+# n: upper bound
+# returns a random integer in [2, n-1], drawing bit strings of the length
+# of n so that almost every draw is a single getrandbits call
+#
+def randRange(n):
+    b = n.bit_length()
+    while True:
+        r = random.getrandbits(b)
+        if 2 <= r < n:
+            return r
 
 
 # Generation of a random element in the subgroup
 #
-# q: prime
-# p: prime such that q divides p - 1
+# p: prime modulus
+# cofactor: (p-1)/q for the prime q that divides p - 1
 # returns a random element in the subgroup of order q modulo p
 #
-def randomsubgroup(q, p):
+def randomsubgroup(p, cofactor):
     while True:
-        h = random.randint(2, p-1)
-        g = power(h, (p-1)// q, p)
+        h = randRange(p)
+        g = powmod(h, cofactor, p)
         if g != 1:
             break
     return g
 
 
+# Fixed-base exponentiation using a precomputed comb table
+#
+# g: fixed base
+# p: modulus
+# bits: bit length of the exponents
+# w: window width
+#
+# table[i][d] holds g^(d*2^(w*i)) mod p, so g^e mod p takes one
+# multiplication per w-bit window of e and no squarings
+#
+class FixedBasePow:
+    def __init__(self, g, p, bits, w=4):
+        self.g = g
+        self.p = mpz(p)
+        self.bits = bits
+        self.w = w
+        self.table = []
+        base = mpz(g) % p
+        for i in range(0, (bits + w - 1) // w):
+            row = [1]
+            for d in range(1, 1 << w):
+                row.append((row[-1] * base) % p)
+            self.table.append(row)
+            base = (row[-1] * base) % p
+
+    def powg(self, e):
+        if e < 0 or e.bit_length() > self.bits:
+            return powmod(self.g, e, self.p)
+        res = 1
+        mask = (1 << self.w) - 1
+        for row in self.table:
+            if e == 0:
+                break
+            d = e & mask
+            if d != 0:
+                res = (res * row[d]) % self.p
+            e = e >> self.w
+        return res
+
+
+# System parameters, with the values derived from them computed once
+#
+# g: generator of the subgroup of order q mod p
+# q: prime order of the subgroup
+# p: prime modulus
+# cofactor: (p-1)/q
+# qbits, pbits: bit lengths given to Parameters
+# fbpow_g: fixed-base table for the powers of g
+#
+@dataclass(frozen=True, slots=True)
+class Group:
+    g: int
+    q: int
+    p: int
+    cofactor: int
+    qbits: int
+    pbits: int
+    fbpow_g: FixedBasePow
+
+
+# Parameters already generated, keyed by (qbits, pbits)
+paramCache = {}
+
+
 # Generation of system parameters
 #
 # qbits: bit length of q, the subgroup of prime order q
 # pbits: bit length of p, the modulus
-# returns (g, q, p), where g is a generator of the subgroup of order q mod p
+# returns a Group with (g, q, p), where g is a generator of the subgroup
+# of order q mod p, later calls with the same bit lengths return the same parameters
 #
 def Parameters(qbits, pbits):
+    if (qbits, pbits) in paramCache:
+        return paramCache[(qbits, pbits)]
+    while True:
+        q = random.getrandbits(qbits)
+        if (number.isPrime(q)):
+            break
+    # keep q and only move m, in steps of 2 so that p = m*q + 1 stays odd
+    m = random.getrandbits(pbits - qbits - 1)
+    m += m & 1
     while True:
-        while True:
-            q = random.getrandbits(qbits)
-            if (number.isPrime(q)):
-                break
-        m = random.getrandbits(pbits - qbits - 1)
         p = m * q + 1
         if (number.isPrime(p)):
             break
-    g = randomsubgroup(q, p)
-    return (g, q, p)
+        m += 2
+    cofactor = (p-1)//q
+    g = randomsubgroup(p, cofactor)
+    ctx = Group(g, q, p, cofactor, qbits, pbits, FixedBasePow(g, p, q.bit_length()))
+    paramCache[(qbits, pbits)] = ctx
+    return ctx
 
 
 # Key generation for a user given the established g, p and q
 #
-# g: fixed generator of cyclic group subset of Zp
-# p: modulus parameter
-# q: order of cyclic group Zp
+# ctx: established parameters, the Group from Parameters
 # returns a pair of keys (public key, secret key)
 #
 # for secret key uses a random subgroup generator and elevates it to
 # a random int less than q and takes its modulo p.
 #
-def keyGen(g, q, p):
-	x = power(randomsubgroup(q,p), random.randint(2,q-1), p)
-	y = power(g,x,p)
+def keyGen(ctx):
+	(q, p) = (ctx.q, ctx.p)
+	x = powmod(randomsubgroup(p, ctx.cofactor), randRange(q), p)
+	y = ctx.fbpow_g.powg(x % q)
 	return (y, x) 
 
 
@@ -89,27 +160,28 @@ def keyGen(g, q, p):
 #
 # y: public key of user
 # m: message in plain text to encrypt
-# g, q, p: established parameters for cyclic group and subset generator
+# ctx: established parameters for cyclic group and subset generator
 # returns (R,C[n]) a pair of the cyphertext, where C is a list of elements
 #
 # for r it generates a random element of cyclic group Zp, then for each
 # element of the plain text it changes it to ascii and operates it.
 #
-def enc(y, m, g, q, p):
-
-    r = power(randomsubgroup(q,p), random.randint(2,q-1), p)
-    R = power(g,r,p)
+def enc(y, m, ctx):
+    (q, p) = (ctx.q, ctx.p)
+    r = powmod(randomsubgroup(p, ctx.cofactor), randRange(q), p)
+    # plain ints in the cyphertext, not gmpy2 mpz
+    R = int(ctx.fbpow_g.powg(r % q))
 
-    yr = power(y,r,p)
+    yr = powmod(y,r,p)
 
     if (isinstance(m, int) == True):
-        C = m*yr
+        C = int((m*yr) % p)
         m_enc = (R, C)
         return m_enc
 
     C = []
     for i in range(0, len(m)):
-        C.append( ord(m[i])*yr)
+        C.append( int((ord(m[i])*yr) % p) )
 
     m_enc = (R, C)
     return m_enc
@@ -120,24 +192,25 @@ def enc(y, m, g, q, p):
 #
 # x: secret key of user
 # m_enc: pair (R,C[n]) of cyphertext to decrypt
-# p: established modulus operator
+# ctx: established parameters
 #
 # if decrypts each element using private key and generates
 # a string of the plain text
 #
-def dec(x, m_enc, p):
+def dec(x, m_enc, ctx):
+    p = ctx.p
     R = m_enc[0]
     C = m_enc[1]
 
-    Rx = power(R,x,p)
+    Rx_inv = powmod(R,-x,p)
 
-    if (isinstance(C, int) == True):
-        m_dec = C/Rx
+    if (isinstance(C, list) == False):
+        m_dec = (C*Rx_inv) % p
         return m_dec
 
     m_dec = []
     for i in range(0, len(C)):
-        m_dec.append( chr(int(C[i]/Rx)) )
+        m_dec.append( chr((C[i]*Rx_inv) % p) )
 
     m_dec = ''.join(m_dec)
     return m_dec
@@ -149,16 +222,16 @@ def dec(x, m_enc, p):
 
 
 # Generating parameters
-# (g, q, p) = Parameters(160, 1024) # For testing only! INSECURE!
-(g, q, p) = Parameters(256, 2024) # For use in practice
+# ctx = Parameters(160, 1024) # For testing only! INSECURE!
+ctx = Parameters(256, 2024) # For use in practice
 
 
 # Alice generates its public key and private key
-pk_A, sk_A = keyGen(g, q, p)
+pk_A, sk_A = keyGen(ctx)
 
 
 # Bob generates its public key and private key
-pk_B, sk_B = keyGen(g, q, p)
+pk_B, sk_B = keyGen(ctx)
 
 
 # Alice wants to send a message to Bob.
@@ -167,12 +240,12 @@ print("\nOriginal message:\n "+str(m_original_A))
 
 
 # Alice encrypts it with Bob's public key.
-m_enc = enc(pk_B, m_original_A, g, q, p)
+m_enc = enc(pk_B, m_original_A, ctx)
 print("\nCyphertext:\n "+str(m_enc))
 
 
 # Bob then proceeds to decrypt it with his private key.
-m_dec = dec(sk_B, m_enc, p)
+m_dec = dec(sk_B, m_enc, ctx)
 print("\nDecrypted message:\n "+str(m_dec))
 
 
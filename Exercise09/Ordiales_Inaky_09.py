@@ -3,6 +3,8 @@
 #   pip install pycryptodomex
 # Documentation for PyCryptodome
 #   https://pycryptodome.readthedocs.io/en/latest/
+# gmpy2 is used for faster big integer arithmetic when it is installed
+#   pip install gmpy2
 
 #=====================================================================
 # IÑAKY ORDIALES CABALLERO --------------------------------- May 2023.
@@ -10,8 +12,15 @@
 
 
 from Cryptodome.Random import random
+from Cryptodome.Random import get_random_bytes
 from Cryptodome.Util import number
 
+try:
+    from gmpy2 import powmod
+except ImportError:
+    # Without gmpy2 the built-in integers give the same results, only slower
+    powmod = pow
+
 
 """
 Function that shares a secret x.
@@ -59,10 +68,14 @@ def generateCoefficients(x, f, q):
     # Explanation: we just added the secret as the first coefficient and then we 
     #   generated the other f random coefficients for our polinomial of degree f
     #   with f+1 coeffs. 
+    # one random buffer for all the coefficients, the 128 extra bits of
+    #   each one make the bias of the reduction modulo q negligible
+    nbytes = (q.bit_length() + 128 + 7) // 8
+    buf = get_random_bytes(nbytes * f)
     coeffs = []
     coeffs.append(x)
     for i in range(0,f):
-        coeffs.append(random.randint(0, q))
+        coeffs.append(int.from_bytes(buf[i*nbytes:(i+1)*nbytes], 'big') % q)
     return coeffs
 
 
@@ -81,42 +94,16 @@ Returns:
 def polynomial(val, coefficients, f, q):
     #TODO: implement this function
     # Explanation: evaluating the polinomial is just a for loop that goes through the
-    #   coefficients and multiplies by the value given elevated to its corresponding
-    #   degree.
+    #   coefficients from the highest degree down (Horner's rule), multiplying the
+    #   partial value by the value given and adding the next coefficient.
     polVal = 0
-    for i in range(0, f+1):
-        polVal += (coefficients[i]*power(val, i, q))
-        polVal %= q
+    val = val % q
+    for c in reversed(coefficients):
+        polVal = (polVal*val + c) % q
     return polVal
 
 
 
-"""
-Utility function for modular exponentiation.
-
-Args:
-    x: base 
-    e: exponent
-    p: modulus 
-
-Returns:
-    result: (a^x) mod p 
-"""
-def power(x, e, p):
-    result = 1
-    x = x % p
-    if (x == 0):
-        return 0
-    while (e > 0):
-        if ((e & 1) == 0):
-            x = (x * x) % p
-            e = e >> 1
-        else:
-            result = (result * x) % p
-            e = e - 1
-    return result
-
-
 """
 Function that reconstructs the secret from f + 1 shares.
 
@@ -138,25 +125,12 @@ def reconstruct(shares, q):
     #   modular division of integers is not straightforward and instead is the modInverse(denom)*numerator.
     #   With that I just did a nested for loop for separately calculating all the numerators and denominators
     #   of the terms added to build up the secret. Then I added the proper term (doing the steps for integer modular division).
-    numerator   = 1
-    denominator = 1
-    secret      = 0
-    l = len(shares)
-
-    for i in range(0, l):
-        numerator   = 1
-        denominator = 1
-        for j in range (0, l):
-            if i != j:
-                numerator   *= shares[j][0]
-                numerator   %= q
-                denominator *= (shares[j][0]-shares[i][0])
-                denominator %= q
+    secret = 0
+    xs = [share[0] for share in shares]
+    lambdas = lagrangeCoefficients(xs, q)
 
-        numerator *= shares[i][1]
-
-        # numerator / denominator
-        secret += modInverse(denominator, q) * numerator
+    for i in range(0, len(shares)):
+        secret += lambdas[i] * shares[i][1]
         secret %= q
 
     return secret
@@ -173,12 +147,77 @@ Returns:
     inverted: inverted value
 """
 def modInverse(x, q):
-    if x < 0 :
-        x = q + x
-    inverted = power(x, q-2, q)
+    inverted = powmod(x % q, -1, q)
     return inverted
 
 
+"""
+Function that computes the Lagrange coefficients at 0 for the x values
+of the shares.
+
+Args:
+    xs: list of the x values of the shares
+    q: the prime number
+
+Returns:
+    lambdas: list of coefficients, lambdas[i] = prod_{j!=i} xs[j] / (xs[j] - xs[i]) mod q
+"""
+def lagrangeCoefficients(xs, q):
+    l = len(xs)
+
+    # products of all the other x values, from prefix and suffix products
+    prefix = [1] * (l+1)
+    suffix = [1] * (l+1)
+    for i in range(0, l):
+        prefix[i+1] = (prefix[i] * xs[i]) % q
+    for i in range(l-1, -1, -1):
+        suffix[i] = (suffix[i+1] * xs[i]) % q
+
+    denominators = []
+    for i in range(0, l):
+        denominator = 1
+        for j in range(0, l):
+            if i != j:
+                denominator *= (xs[j] - xs[i])
+                denominator %= q
+        denominators.append(denominator)
+
+    # numerator / denominator
+    inverses = batchInverse(denominators, q)
+    lambdas = []
+    for i in range(0, l):
+        lambdas.append((prefix[i] * suffix[i+1] * inverses[i]) % q)
+    return lambdas
+
+
+"""
+Function that inverts a list of values modulo q with a single modular
+inverse (Montgomery's trick).
+
+Args:
+    values: list of GF(q) elements, none of them zero
+    q: the prime number
+
+Returns:
+    inverses: list with the inverse of each value
+"""
+def batchInverse(values, q):
+    l = len(values)
+    # for a few values separate inverses are as cheap
+    if l <= 3:
+        return [modInverse(v, q) for v in values]
+    acc = [1] * l
+    for i in range(1, l):
+        acc[i] = (acc[i-1] * values[i-1]) % q
+    inv = modInverse((acc[l-1] * values[l-1]) % q, q)
+    inverses = [0] * l
+    for i in range(l-1, -1, -1):
+        inverses[i] = (acc[i] * inv) % q
+        inv = (inv * values[i]) % q
+    return inverses
+
+
+
 def main():
     q = number.getPrime(1024)
     print ('q =', q)
@@ -4,6 +4,8 @@
 #   pip install pycryptodomex
 # Documentation for PyCryptodome
 #   https://pycryptodome.readthedocs.io/en/latest/
+# gmpy2 is used for faster big integer arithmetic when it is installed
+#   pip install gmpy2
 
 #=====================================================================
 # IÑAKY ORDIALES CABALLERO --------------------------------- May 2023.
@@ -17,8 +19,18 @@
 ######################################
 
 from Cryptodome.Random import random
+from Cryptodome.Random import get_random_bytes
 from Cryptodome.Util import number
-from Cryptodome.Hash import SHA256
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+import hashlib
+
+try:
+    from gmpy2 import mpz, powmod
+except ImportError:
+    # Without gmpy2 the built-in integers give the same results, only slower
+    mpz, powmod = int, pow
 
 
 
@@ -32,24 +44,22 @@ Key generation function:
   Generates a public key and n shares of the secret key
 
   Args:
-    g: field generator
-    q: field size
-    p: prime number
+    ctx: global parameters, the Group from Parameters
     f: faulty parties
     n: total parties
   
   Returns:
     list: (pk, (skeys))
 """
-def KeyGen(g, q, p, f, n):
+def KeyGen(ctx, f, n):
     
-    x = random.randint(2, q-1)
-    y = power(g, x, p)
+    x = randRange(ctx.q)
+    y = ctx.fbpow_g.powg(x)
 
     keys = []
     keys.append(x)
     keys.append(y)
-    xi = share(x, f, n, p)
+    xi = share(x, f, n, ctx.p)
     keys.append(xi)
 
     return keys
@@ -60,21 +70,17 @@ Encryption function:
   Encrypts a message m into cyphertex (R,C)
 
   Args:
-    g, q, p: global parameters
+    ctx:     global parameters
     pk:      public key
     m:       message to encrypt
 
   Returns:
     cyphertext pair (R, C)
 """
-def Enc(g, q, p, pk, m):
-    r = random.randint(2, q-1)
-    R = power(g, r, p)
-    value = power(pk, r, p)
-    value = value.to_bytes((value.bit_length() + 7) // 8, 'big')
-    hash_value = SHA256.new(value).digest()
-    hash_value = int.from_bytes(hash_value, 'big')
-    C = m ^ (hash_value)
+def Enc(ctx, pk, m):
+    r = randRange(ctx.q)
+    R = ctx.fbpow_g.powg(r)
+    C = m ^ kdf(powmod(pk, r, ctx.p))
     return (R, C)
 
 
@@ -92,7 +98,7 @@ Decryption function:
 
 """
 def Dec(ski, R, p):
-    di = power(R, ski[1], p)
+    di = powmod(R, ski[1], p)
     return (ski[0], di)
 
 
@@ -103,35 +109,25 @@ Recover function:
   Args:
     D: list of decrypted shares
     C: cyphertext
-    p: prime number
+    ctx: global parameters
 
   Returns:
     decrypted recovered message
 """
-def Recover(S, C, p, q):
+def Recover(S, C, ctx):
 
+    p = ctx.p
     n = len(S)
     value = 1
 
+    xs = [s[0] for s in S]
+    lambdas = lagrangeCoefficients(xs, p)
+
     for i in range(0, n):
-        numerator   = 1
-        denominator = 1
-        for j in range(0, n):
-            if i!=j:
-                numerator   *= S[j][0]
-                numerator   %= p
-                denominator *= (S[j][0] - S[i][0])
-                denominator %= p
-        lamb   = modInverse(denominator, p) * numerator
-        lamb  %= p
-        value *= power(S[i][1], lamb, p)
+        value *= powmod(S[i][1], lambdas[i], p)
         value %= p
 
-    value = value.to_bytes((value.bit_length() + 7) // 8, 'big')
-    hash_value = SHA256.new(value).digest()
-    hash_value = int.from_bytes(hash_value, 'big')
-
-    m = hash_value ^ C
+    m = kdf(value) ^ C
 
     return m
 
@@ -142,36 +138,122 @@ def Recover(S, C, p, q):
 #____________________________________#
 
 
+# Fixed-base exponentiation using a precomputed comb table
+#   g: fixed base
+#   p: modulus
+#   bits: bit length of the exponents
+#   w: window width
+#
+#   table[i][d] holds g^(d*2^(w*i)) mod p, so g^e mod p takes one
+#   multiplication per w-bit window of e and no squarings
+#
+class FixedBasePow:
+    def __init__(self, g, p, bits, w=4):
+        self.g = g
+        self.p = mpz(p)
+        self.bits = bits
+        self.w = w
+        self.table = []
+        base = mpz(g) % p
+        for i in range(0, (bits + w - 1) // w):
+            row = [1]
+            for d in range(1, 1 << w):
+                row.append((row[-1] * base) % p)
+            self.table.append(row)
+            base = (row[-1] * base) % p
+
+    def powg(self, e):
+        if e < 0 or e.bit_length() > self.bits:
+            return powmod(self.g, e, self.p)
+        res = 1
+        mask = (1 << self.w) - 1
+        for row in self.table:
+            if e == 0:
+                break
+            d = e & mask
+            if d != 0:
+                res = (res * row[d]) % self.p
+            e = e >> self.w
+        return res
+
+
+# System parameters, with the values derived from them computed once
+#   g: generator of the subgroup of order q mod p
+#   q: prime order of the subgroup
+#   p: prime modulus
+#   cofactor: (p-1)/q
+#   qbits, pbits: bit lengths given to Parameters
+#   fbpow_g: fixed-base table for the powers of g
+#
+@dataclass(frozen=True, slots=True)
+class Group:
+    g: int
+    q: int
+    p: int
+    cofactor: int
+    qbits: int
+    pbits: int
+    fbpow_g: FixedBasePow
+
+
+# Parameters already generated, keyed by (qbits, pbits)
+paramCache = {}
+
+
 # Generation of system parameters
 #   qbits: bit length of q, the subgroup of prime order q
 #   pbits: bit length of p, the modulus
 #
-#   returns (g, q, p), where g is a generator of the subgroup of order q mod p
+#   returns a Group with (g, q, p), where g is a generator of the subgroup
+#   of order q mod p, later calls with the same bit lengths return the same
+#   parameters
 #
 def Parameters(qbits, pbits):
+    if (qbits, pbits) in paramCache:
+        return paramCache[(qbits, pbits)]
+    while True:
+        q = random.getrandbits(qbits)
+        if (number.isPrime(q)):
+            break
+    # keep q and only move m, in steps of 2 so that p = m*q + 1 stays odd
+    m = random.getrandbits(pbits - qbits - 1)
+    m += m & 1
     while True:
-        while True:
-            q = random.getrandbits(qbits)
-            if (number.isPrime(q)):
-                break
-        m = random.getrandbits(pbits - qbits - 1)
         p = m * q + 1
         if (number.isPrime(p)):
             break
-    g = randomsubgroup(q, p)
-    return (g, q, p)
+        m += 2
+    cofactor = (p-1)//q
+    g = randomsubgroup(p, cofactor)
+    ctx = Group(g, q, p, cofactor, qbits, pbits, FixedBasePow(g, p, q.bit_length()))
+    paramCache[(qbits, pbits)] = ctx
+    return ctx
+
+
+# Random integer for exponents and group elements
+#   n: upper bound
+#
+#   returns a random integer in [2, n-1], drawing bit strings of the length
+#   of n so that almost every draw is a single getrandbits call
+#
+def randRange(n):
+    b = n.bit_length()
+    while True:
+        r = random.getrandbits(b)
+        if 2 <= r < n:
+            return r
 
 
 # Generation of a random element in the subgroup
-#   q: prime
-#   p: prime such that q divides p - 1
+#   p: prime modulus
+#   cofactor: (p-1)/q for the prime q that divides p - 1
 #
 #   returns a random element in the subgroup of order q modulo p
 #
-def randomsubgroup(q, p):
+def randomsubgroup(p, cofactor):
     while True:
-        h = random.randint(2, p-1)
-        g = power(h, (p-1)//q, p)
+        h = randRange(p)
+        g = powmod(h, cofactor, p)
         if g != 1:
             break
     return g
@@ -208,10 +290,14 @@ Function that generates a list of coefficients.
   returns a list of coefficients
 """
 def generateCoefficients(x, f, p):
+    # one random buffer for all the coefficients, the 128 extra bits of
+    #   each one make the bias of the reduction modulo p negligible
+    nbytes = (p.bit_length() + 128 + 7) // 8
+    buf = get_random_bytes(nbytes * f)
     coeffs = []
     coeffs.append(x)
     for i in range(0,f):
-        coeffs.append(random.randint(0, p-1))
+        coeffs.append(int.from_bytes(buf[i*nbytes:(i+1)*nbytes], 'big') % p)
     return coeffs
 
 
@@ -225,10 +311,11 @@ Function that evaluates the polynomial.
   returns a polynomial value
 """
 def polynomial(val, coefficients, f, p):
+    # Horner's rule, from the highest degree down
     polVal = 0
-    for i in range(0, f+1):
-        polVal += (coefficients[i]*power(val, i, p))
-        polVal %= p
+    val = val % p
+    for c in reversed(coefficients):
+        polVal = (polVal*val + c) % p
     return polVal
 
 
@@ -239,27 +326,17 @@ def polynomial(val, coefficients, f, p):
 #____________________________________#
 
 
+
 """
-Utility function for modular exponentiation.
-  x: base 
-  e: exponent
-  p: modulus 
+Utility function that hashes a group element into the mask for the message.
+  val: group element
 
-  returns (a^x) mod p 
+  returns SHA-256 of the big-endian bytes of val, as an integer
 """
-def power(x, e, p):
-    result = 1
-    x = x % p
-    if (x == 0):
-        return 0
-    while (e > 0):
-        if ((e & 1) == 0):
-            x = (x * x) % p
-            e = e >> 1
-        else:
-            result = (result * x) % p
-            e = e - 1
-    return result
+def kdf(val):
+    val = int(val)
+    b = val.to_bytes((val.bit_length() + 7) // 8, 'big')
+    return int.from_bytes(hashlib.sha256(b).digest(), 'big')
 
 
 """
@@ -270,39 +347,84 @@ Utility function that computes an inverse of x modulo p.
   returns inverted value
 """
 def modInverse(x, p):
-    if x < 0 :
-        x = p + x
-    inverted = power(x, p-2, p)
+    inverted = powmod(x % p, -1, p)
     return inverted
 
 
 """
-Function that reconstructs the secret from f + 1 shares.
-  shares: list of f + 1 shares
+Utility function that inverts a list of values modulo q with a single
+modular inverse (Montgomery's trick).
+  values: list of GF(q) elements, none of them zero
   q: the prime number
 
-  returns reconstructed value
+  returns a list with the inverse of each value
 """
-def reconstruct(shares, q):
-    numerator   = 1
-    denominator = 1
-    secret      = 0
-    l = len(shares)
+def batchInverse(values, q):
+    l = len(values)
+    # for a few values separate inverses are as cheap
+    if l <= 3:
+        return [modInverse(v, q) for v in values]
+    acc = [1] * l
+    for i in range(1, l):
+        acc[i] = (acc[i-1] * values[i-1]) % q
+    inv = modInverse((acc[l-1] * values[l-1]) % q, q)
+    inverses = [0] * l
+    for i in range(l-1, -1, -1):
+        inverses[i] = (acc[i] * inv) % q
+        inv = (inv * values[i]) % q
+    return inverses
+
+
+"""
+Utility function that computes the Lagrange coefficients at 0 for the
+x values of the shares.
+  xs: list of the x values of the shares
+  q: the prime number
+
+  returns a list lambdas, lambdas[i] = prod_{j!=i} xs[j] / (xs[j] - xs[i]) mod q
+"""
+def lagrangeCoefficients(xs, q):
+    l = len(xs)
+
+    # products of all the other x values, from prefix and suffix products
+    prefix = [1] * (l+1)
+    suffix = [1] * (l+1)
+    for i in range(0, l):
+        prefix[i+1] = (prefix[i] * xs[i]) % q
+    for i in range(l-1, -1, -1):
+        suffix[i] = (suffix[i+1] * xs[i]) % q
 
+    denominators = []
     for i in range(0, l):
-        numerator   = 1
         denominator = 1
-        for j in range (0, l):
+        for j in range(0, l):
             if i != j:
-                numerator   *= shares[j][0]
-                numerator   %= q
-                denominator *= (shares[j][0]-shares[i][0])
+                denominator *= (xs[j] - xs[i])
                 denominator %= q
+        denominators.append(denominator)
 
-        numerator *= shares[i][1]
+    # numerator / denominator
+    inverses = batchInverse(denominators, q)
+    lambdas = []
+    for i in range(0, l):
+        lambdas.append((prefix[i] * suffix[i+1] * inverses[i]) % q)
+    return lambdas
+
+
+"""
+Function that reconstructs the secret from f + 1 shares.
+  shares: list of f + 1 shares
+  q: the prime number
+
+  returns reconstructed value
+"""
+def reconstruct(shares, q):
+    secret = 0
+    xs = [share[0] for share in shares]
+    lambdas = lagrangeCoefficients(xs, q)
 
-        # numerator / denominator
-        secret += modInverse(denominator, q) * numerator
+    for i in range(0, len(shares)):
+        secret += lambdas[i] * shares[i][1]
         secret %= q
 
     return secret
@@ -320,12 +442,13 @@ def reconstruct(shares, q):
 
 def main():
 
-    # Parameters: 
+    # Parameters (Group): 
     #   g - generator
     #   q - size of group generated
     #   p - prime number (mod)
-    #(g, q, p) = Parameters(160, 1024)     # For testing only! INSECURE!
-    (g, q, p) = Parameters(256, 2048)
+    #ctx = Parameters(160, 1024)     # For testing only! INSECURE!
+    ctx = Parameters(256, 2048)
+    p = ctx.p
 
     # Parties:
     #   n = total parties
@@ -339,14 +462,14 @@ def main():
     # Key generation
     # Using sk for decryption tests.
     # skeys are the shares
-    (sk, pk, skeys) = KeyGen(g, q, p, f, n)
+    (sk, pk, skeys) = KeyGen(ctx, f, n)
 
     # Encryption
     m = random.getrandbits(256)
     #m = 10
     print('\nMessage: ', m)
 
-    (R, C) = Enc(g, q, p, pk, m)
+    (R, C) = Enc(ctx, pk, m)
     print('\nMessage Encrypted.')
     print('R = ', R)
     print('C = ', C)
@@ -354,11 +477,7 @@ def main():
 #-------------- Checking for partial points in the process, not part of solution -----------
 
     # Checking for decryption with secret key:
-    val = power(R, sk, p)
-    val = val.to_bytes((val.bit_length() + 7) // 8, 'big')
-    hash_val = SHA256.new(val).digest()
-    hash_val = int.from_bytes(hash_val, 'big')
-    res = hash_val ^ C
+    res = kdf(powmod(R, sk, p)) ^ C
     print('\n\nDecryption with secret key.')
     print('Message: ', res)
 
@@ -378,16 +497,15 @@ def main():
 # ----------------- Starting solution decryption -------------------
     
 
-    # getting decrypted shares for everyone
-    D = []
-    for ski in skeys:
-        (pos, di) = Dec(ski, R, p)
-        D.append((pos, di))
+    # getting decrypted shares for everyone, in parallel since every
+    # party only needs its own share
+    with ProcessPoolExecutor() as executor:
+        D = list(executor.map(partial(Dec, R=R, p=p), skeys))
 
     # Choosing random f+1 samples to use on reconstruction.
     S = random.sample(D, f+1)
 
-    reconstructed = Recover(S, C, p, q)
+    reconstructed = Recover(S, C, ctx)
 
     print('\n\nDecryption with shares.')
     print("\n\nEncrypted message = " + str(m))
@@ -402,7 +520,8 @@ def main():
 
 
 # Main body execution
-main()
+if __name__ == "__main__":
+    main()
 
 # JM: Your solution is not working correctly. I suspect that the problem is in the key generation function.
 # Also recovery function does not work correctly.
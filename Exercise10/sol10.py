@@ -3,10 +3,18 @@
 #   pip3 install pycryptodomex
 # Documentation for PyCryptodome
 #   https://pycryptodome.readthedocs.io/en/latest/
-# This code works with pyhton version 3.7.4 
+# This code works with pyhton version 3.8 or later (pow with exponent -1)
+# gmpy2 is used to evaluate the shares faster when it is installed
+#   pip3 install gmpy2
 
 from Cryptodome.Random import random
 from Cryptodome.Util import number
+import os
+
+try:
+    from gmpy2 import mpz
+except ImportError:
+    mpz = int
 
 """
 Function that shares a secret x.
@@ -22,11 +30,9 @@ Returns:
 """
 def share(x, f, n, q):
     coefficients = generateCoefficients(x,f,q)
-    shares = []
-    for i in range(n):
-        val = random.randint(0, q-1)
-        share = polynomial(val, coefficients, f, q)
-        shares.append((val,share))
+    vals = randintsBelow(q, n)
+    values = polynomialBatch(vals, coefficients, q)
+    shares = list(zip(vals, values))
     return shares
 
 """
@@ -41,12 +47,36 @@ Returns:
     coefficients: a list of coefficients
 """
 def generateCoefficients(x, f, q):
-    coefficients = []
-    for i in range(1, f + 1):
-        coefficients.append(random.randint(0, q-1))
-    coefficients.append(x)
+    coefficients = randintsBelow(q, f) + [x]
     return coefficients
 
+"""
+Function that draws several uniform random integers below q from a single
+os.urandom buffer instead of one call per value.
+
+Args:
+    q: the upper bound
+    n: how many integers to draw
+
+Returns:
+    values: a list of n integers in [0, q-1]
+"""
+def randintsBelow(q, n):
+    nbits = q.bit_length()
+    nbytes = (nbits + 7) // 8
+    mask = (1 << nbits) - 1
+    values = []
+    while len(values) < n:
+        # twice the bytes needed, since up to half the draws are rejected
+        buf = os.urandom(nbytes * (n - len(values)) * 2)
+        for i in range(0, len(buf), nbytes):
+            v = int.from_bytes(buf[i:i+nbytes], 'big') & mask
+            if v < q:
+                values.append(v)
+                if len(values) == n:
+                    break
+    return values
+
 
 """
 Function that compute polynomial value.
@@ -61,36 +91,32 @@ Returns:
     total: a polynomial value
 """
 def polynomial(val, coefficients, f, q):
-    total = 0;
-    for i, coeff in enumerate(coefficients):
-        total =  (total + coeff * power(val, (f - i), q)) % q 
+    # Horner's rule, the coefficients go from degree f down to 0
+    total = 0
+    val = val % q
+    for coeff in coefficients:
+        total = (total * val + coeff) % q
     return total
 
 """
-Utility function for modular exponentiation.
+Function that computes the polynomial value at several points at once,
+the coefficients and q are converted to mpz a single time for all of them.
 
 Args:
-    x: base 
-    e: exponent
-    p: modulus 
+    vals: the points to evaluate at
+    coefficients: the list of coefficients, from degree f down to 0
+    q: the prime number
 
 Returns:
-    result: (a^x) mod p 
+    totals: a list with the polynomial value at each point
 
 """
-def power(x, e, p):
-    result = 1
-    x = x % p
-    if (x == 0):
-        return 0
-    while (e > 0):
-        if ((e & 1) == 0):
-            x = (x * x) % p
-            e = e >> 1
-        else:
-            result = (result * x) % p
-            e = e - 1
-    return result
+def polynomialBatch(vals, coefficients, q):
+    f = len(coefficients) - 1
+    coefficients = [mpz(c) for c in coefficients]
+    q = mpz(q)
+    totals = [int(polynomial(val, coefficients, f, q)) for val in vals]
+    return totals
 
 """
 Computes inverted value such that x * inverted mod q = 1
@@ -104,11 +130,154 @@ Returns:
 
 """
 def modInverse(x, q):
-    if x < 0 :
-        x = q + x
-    inverted = power(x, q-2, q)
+    inverted = pow(x % q, -1, q)
     return inverted
 
+"""
+Inverts a list of values modulo q with a single modular inverse
+(Montgomery's trick).
+
+Args:
+    values: the GF(q) elements to invert, none of them zero
+    q: the prime number
+
+Returns:
+    inverses: a list with the inverse of each value
+
+"""
+def batchInverse(values, q):
+    l = len(values)
+    acc = [1] * l
+    for i in range(1, l):
+        acc[i] = (acc[i-1] * values[i-1]) % q
+    inv = modInverse(acc[l-1] * values[l-1], q)
+    inverses = [0] * l
+    for i in range(l-1, -1, -1):
+        inverses[i] = (acc[i] * inv) % q
+        inv = (inv * values[i]) % q
+    return inverses
+
+"""
+Computes the Lagrange coefficients at 0 for the x values of the shares.
+
+Args:
+    xs: the x values of the shares
+    q: the prime number
+
+Returns:
+    lambdas: lambdas[i] = prod_{j!=i} xs[j] / (xs[j] - xs[i]) mod q
+
+"""
+def lagrangeCoefficients(xs, q):
+    l = len(xs)
+    # products of all the other x values, from prefix and suffix products
+    prefix = [1] * (l+1)
+    suffix = [1] * (l+1)
+    for i in range(l):
+        prefix[i+1] = (prefix[i] * xs[i]) % q
+    for i in range(l-1, -1, -1):
+        suffix[i] = (suffix[i+1] * xs[i]) % q
+    denominators = []
+    for i in range(l):
+        denominator = 1
+        for j in range(l):
+            if i != j:
+                denominator = (denominator * (xs[j] - xs[i])) % q
+        denominators.append(denominator)
+    inverses = batchInverse(denominators, q)
+    lambdas = []
+    for i in range(l):
+        lambdas.append((prefix[i] * suffix[i+1] * inverses[i]) % q)
+    return lambdas
+
+"""
+Precomputes the comb table of a fixed base, table[i][d] holds
+base^(d*2^(w*i)) mod p.
+
+Args:
+    base: the fixed base
+    p: modulus
+    bits: bit length of the exponents that will be used
+    w: window width
+
+Returns:
+    (w, table): the window width and the table, for fixedBasePow
+
+"""
+def fixedBaseTable(base, p, bits, w=4):
+    table = []
+    x = base % p
+    for i in range(-(-bits // w)):
+        row = [1]
+        for d in range(1, 1 << w):
+            row.append((row[-1] * x) % p)
+        table.append(row)
+        x = (row[-1] * x) % p
+    return (w, table)
+
+"""
+Modular exponentiation that uses the comb table of the base when it is
+given, one multiplication per w-bit window of e and no squarings.
+
+Args:
+    base: base
+    e: exponent
+    p: modulus
+    fbTable: (w, table) from fixedBaseTable(base, p, ...), or None
+
+Returns:
+    result: (base^e) mod p
+
+"""
+def fixedBasePow(base, e, p, fbTable=None):
+    if fbTable is None or e < 0 or e.bit_length() > fbTable[0] * len(fbTable[1]):
+        return pow(base, e, p)
+    (w, table) = fbTable
+    mask = (1 << w) - 1
+    result = 1
+    for row in table:
+        if e == 0:
+            break
+        d = e & mask
+        if d:
+            result = (result * row[d]) % p
+        e = e >> w
+    return result
+
+"""
+Multi-exponentiation with Straus's method, the bases share a single
+chain of squarings and each one adds a multiplication per w-bit window.
+
+Args:
+    bases: list of bases
+    exps: list of non-negative exponents, one per base
+    p: modulus
+    w: window width
+
+Returns:
+    result: prod(bases[i]^exps[i]) mod p
+
+"""
+def multiPow(bases, exps, p, w=4):
+    tables = []
+    for b in bases:
+        row = [1]
+        for d in range(1, 1 << w):
+            row.append((row[-1] * b) % p)
+        tables.append(row)
+    mask = (1 << w) - 1
+    windows = -(-max(e.bit_length() for e in exps) // w)
+    result = 1
+    for k in range(windows - 1, -1, -1):
+        for _ in range(w):
+            result = (result * result) % p
+        shift = k * w
+        for i, e in enumerate(exps):
+            d = (e >> shift) & mask
+            if d:
+                result = (result * tables[i][d]) % p
+    return result
+
 """
 Generation of a random element in the subgroup.
 
@@ -123,7 +292,7 @@ Returns:
 def randomsubgroup(q, p):
     while True:
         h = random.randint(2, p-1)
-        g = power(h, (p-1)//q, p)
+        g = pow(h, (p-1)//q, p)
         if (g != 1):
             break
     return g
@@ -136,7 +305,8 @@ Args:
     pbits: bit length of p, the modulus
 
 Returns:
-    (g, q, p): g is a generator of the subgroup of order q mod p
+    (g, q, p, gTable): g is a generator of the subgroup of order q mod p,
+    gTable its comb table for fixedBasePow
 
 """
 def Parameters(qbits, pbits):
@@ -150,7 +320,8 @@ def Parameters(qbits, pbits):
         if (number.isPrime(p)):
             break
     g = randomsubgroup(q, p)
-    return (g, q, p)
+    gTable = fixedBaseTable(g, p, qbits)
+    return (g, q, p, gTable)
 
 """
 Function that implements key generation.
@@ -159,15 +330,18 @@ Args:
     p, q, g: g is a generator of the subgroup of order q mod p
     n: number of shares
     f: treshold
+    gTable: comb table of g from Parameters, or None
 
 Returns:
-    (pk, shares): a global public key and a share sk_i for each party x_i
+    (pk, shares, pkTable): a global public key, a share sk_i for each
+    party x_i and the comb table of pk for encrypt
 """
-def KeyGen(p,q,g,n,f):
+def KeyGen(p,q,g,n,f,gTable=None):
     s = random.randint(2, q-1)
     shares = share(s, f, n, q)
-    pk = power(g,s,p)
-    return (pk, shares)
+    pk = fixedBasePow(g,s,p,gTable)
+    pkTable = fixedBaseTable(pk, p, q.bit_length())
+    return (pk, shares, pkTable)
 
 """
 Function that implements textbook ElGamal encryption.
@@ -176,14 +350,15 @@ Args:
     p, q, g: g is a generator of the subgroup of order q mod p
     pk: public key
     m: a message we want to encrypt
+    gTable, pkTable: comb tables of g and pk, or None
 
 Returns:
     (R, C): encrypted message
 """
-def encrypt(p,q,g,pk,m):
+def encrypt(p,q,g,pk,m,gTable=None,pkTable=None):
     r = random.randint(2, q-1)
-    R = power(g, r, p)
-    C = (power(pk, r, p) * m) % p 
+    R = fixedBasePow(g, r, p, gTable)
+    C = (fixedBasePow(pk, r, p, pkTable) * m) % p 
     return (R,C)
 
 
@@ -202,7 +377,7 @@ Returns:
 def decrypt(p,q,g,pk,sk,c):
     (x_i,sk_i) = sk
     (R,C) = c
-    d_i = power(R,sk_i,p)
+    d_i = pow(R,sk_i,p)
     return (x_i,d_i)
 
 """
@@ -218,21 +393,15 @@ Returns:
 """
 def recover(p,q,g,D,c):
     (R,C) = c
-    prod = 1
-    for i,share_i in enumerate(D):
-        x_i,d_i = share_i
-        exp = 1
-        for j,share_j in enumerate(D):
-            x_j, d_j = share_j
-            if i != j :
-                exp = (exp * (x_j%q) * modInverse(x_j - x_i,q)) % q
-        prod = (prod * power(d_i,exp,p)) % p
+    xs = [x_i % q for (x_i,d_i) in D]
+    lambdas = lagrangeCoefficients(xs, q)
+    prod = multiPow([d_i for (x_i,d_i) in D], lambdas, p)
     val = (C * modInverse(prod,p)) % p
     return val
 
 def main():
-    (g, q, p) = Parameters(160, 1024)     # For testing only! INSECURE!
-    # (g, q, p) = Parameters(256, 2024)     # For use in practice
+    (g, q, p, gTable) = Parameters(160, 1024)     # For testing only! INSECURE!
+    # (g, q, p, gTable) = Parameters(256, 2024)     # For use in practice
 
     n = number.getRandomRange(10, 100)
     print ('n =', n)
@@ -242,9 +411,9 @@ def main():
     # generate a message m
     m = number.getRandomRange(2, p-1)
 
-    pk, shares = KeyGen(p,q,g,n,f)
+    pk, shares, pkTable = KeyGen(p,q,g,n,f,gTable)
     
-    c = encrypt(p,q,g,pk,m)
+    c = encrypt(p,q,g,pk,m,gTable,pkTable)
 
     # genereate a subset of shares
     s = random.sample(shares, f+1)
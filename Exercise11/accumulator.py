@@ -1,9 +1,24 @@
-import time
 import secrets
 import hashlib
 import random
 
 
+try:
+    from gmpy2 import mpz, powmod
+    from gmpy2 import is_prime as gmpy_is_prime
+except ImportError:
+    mpz, powmod = int, pow
+    gmpy_is_prime = None
+
+
+# odd primes below 1000, for sieving the prime candidates
+SMALL_PRIMES = [k for k in range(3, 1000, 2)
+                if all(k % d for d in range(3, int(k**0.5) + 1, 2))]
+
+# number of consecutive integers sieved at a time in hash_to_prime
+SIEVE_WINDOW = 4096
+
+
 def miller_rabin(n: int, k=5) -> bool:
 
     s = n - 1
@@ -22,12 +37,15 @@ def miller_rabin(n: int, k=5) -> bool:
                     return False
                 else:
                     i += 1
-                    x = (x**2) % n
+                    x = pow(x, 2, n)
 
     return True
 
 
 def is_prime(n: int) -> bool:
+    # BPSW in C when gmpy2 is installed
+    if gmpy_is_prime is not None:
+        return bool(gmpy_is_prime(n))
     if n < 2:
         return False
     if n < 4:
@@ -38,62 +56,121 @@ def is_prime(n: int) -> bool:
     return miller_rabin(n)
 
 
-def hash_to_prime(input: str, seed: int) -> int:
-    random.seed(seed)
-    hash = hashlib.sha256(str(input).encode())
-    p = int(hash.hexdigest(), 16) * 2**(64)+1
+def hash_to_prime(input: str) -> int:
+    return prime_from_hash(hashlib.sha256(str(input).encode()))
+
 
-    while not is_prime(p):
-        p += 2
+def prime_from_hash(hash) -> int:
+    p = (int.from_bytes(hash.digest(), 'big') << 64) | 1
 
-    return p
+    # sieve [p, p + SIEVE_WINDOW) by the small primes and only test the
+    # odd candidates that are left, then move to the next window
+    while True:
+        sieve = bytearray(SIEVE_WINDOW)
+        for sp in SMALL_PRIMES:
+            start = (-p) % sp
+            sieve[start::sp] = b'\x01' * len(range(start, SIEVE_WINDOW, sp))
+        for k in range(0, SIEVE_WINDOW, 2):
+            if not sieve[k] and is_prime(p + k):
+                return p + k
+        p += SIEVE_WINDOW
 
 
 class Accumulator:
     def __init__(self,  p: int, q: int, n=1000, seed=None, security=2048):
         self.p = p
         self.q = q
-        self.N = self.p * self.q
-        self.phi = (self.p - 1) * (self.q - 1)
+        self.N = mpz(self.p * self.q)
+        self.phi = mpz((self.p - 1) * (self.q - 1))
 
-        if seed is None:
-            seed = time.time_ns()
-        self.seed = seed
+        # seed is accepted for compatibility but unused, the primes only
+        # depend on the hashed input since hash_to_prime lost its seed
 
         self.n = n
         self.x = ["" for _ in range(self.n)]
         self.w = [0] * self.n
         self.security = security
-        self.r = secrets.randbelow(self.N)
-        self.H = lambda i, x: hash_to_prime(str(i)+x, self.seed)
-
-        prod = 1
+        self.r = mpz(secrets.randbelow(self.p * self.q))
+        # sha256 states that have already absorbed str(i), copied by H
+        self.i_hash = [hashlib.sha256(str(i).encode()) for i in range(self.n)]
+        # inverses mod phi of the primes already removed, keyed by prime
+        self.inv_cache = {}
+        # exponents of the updates so far, numbered from log_start on; w[j]
+        # has applied the ones before synced[j] and catches up with the
+        # rest in sync() when a proof needs it
+        self.log = []
+        self.log_start = 0
+        self.synced = [0] * self.n
+
+        # w[i] = r^(product of the other primes), so that
+        # w[i]^p_i = r^(product of all primes) = alpha
+        self.primes = [self.H(i, self.x[i]) for i in range(self.n)]
+        prefix = [1] * (self.n + 1)
+        suffix = [1] * (self.n + 1)
         for i in range(self.n):
-            px = self.H(i, self.x[i])
-            prod *= pow(px, -1, self.phi) % self.N
-        self.alpha = pow(self.r, prod, self.N)
+            prefix[i+1] = (prefix[i] * self.primes[i]) % self.phi
+        for i in range(self.n - 1, -1, -1):
+            suffix[i] = (suffix[i+1] * self.primes[i]) % self.phi
 
         for i in range(self.n):
-            p = self.H(i, self.x[i])
-            self.w[i] = pow(self.alpha, pow(p, -1, self.phi), self.N)
+            self.w[i] = powmod(self.r, (prefix[i] * suffix[i+1]) % self.phi, self.N)
+        self.alpha = powmod(self.w[0], self.primes[0] % self.phi, self.N)
+
+    def H(self, i: int, x: str) -> int:
+        # the prime that hash_to_prime gives for str(i)+x
+        hash = self.i_hash[i].copy()
+        hash.update(x.encode())
+        return prime_from_hash(hash)
+
+    def inv_phi(self, p: int) -> int:
+        inv = self.inv_cache.get(p)
+        if inv is None:
+            inv = powmod(p, -1, self.phi)
+            self.inv_cache[p] = inv
+        return inv
 
     def update(self, i: int, v: str) -> bool:
         if self.x[i] == v:
             return False
 
         pv = self.H(i, v)
-        px = self.H(i, self.x[i])
-        hi = pow(px, -1, self.phi)
-        self.alpha = pow(self.alpha, hi*pv, self.N)
-        for j in range(self.n):
-            if j != i:
-                self.w[j] = pow(self.w[j], hi*pv, self.N)
+        px = self.primes[i]
+        hi = self.inv_phi(px)
+        e = (hi * pv) % self.phi
+        self.alpha = powmod(self.alpha, e, self.N)
+
+        # the other witnesses have to be raised to e too, which is left to
+        # sync(), w[i] takes the earlier updates but skips this one
+        self.sync(i)
+        self.log.append(e)
+        self.synced[i] = self.log_start + len(self.log)
+        self.trim_log()
         self.x[i] = v
+        self.primes[i] = pv
         return True
 
+    def sync(self, i: int):
+        # the missing exponents are combined mod phi into a single one
+        pending = self.log[self.synced[i] - self.log_start:]
+        if pending:
+            e = 1
+            for ek in pending:
+                e = (e * ek) % self.phi
+            self.w[i] = powmod(self.w[i], e, self.N)
+            self.synced[i] = self.log_start + len(self.log)
+            self.trim_log()
+
+    def trim_log(self):
+        # drop the exponents that every witness has already applied
+        done = min(self.synced)
+        if done > self.log_start:
+            del self.log[:done - self.log_start]
+            self.log_start = done
+
     def proof(self, i: int, x: str) -> int:
-        p = self.H(i, x)
-        return pow(self.w[i], p, self.N)
+        self.sync(i)
+        p = self.primes[i] if self.x[i] == x else self.H(i, x)
+        return powmod(self.w[i], p % self.phi, self.N)
 
     def is_member(self, i, x) -> bool:
         if self.x[i] != x:
@@ -110,9 +187,9 @@ if __name__ == "__main__":
     for p in primes:
         assert is_prime(p), f"expected {p} to be prime"
 
-    p = hash_to_prime("hello", 128)
-    q = hash_to_prime("world", 128)
-    r = hash_to_prime("hello", 128)
+    p = hash_to_prime("hello")
+    q = hash_to_prime("world")
+    r = hash_to_prime("hello")
 
     assert is_prime(p), f"expected {p} to be prime"
     assert is_prime(q), f"expected {q} to be prime"
@@ -120,8 +197,8 @@ if __name__ == "__main__":
     assert p != q, f"expected {p} != {q}"
     assert p == r, f"expected {p} == {r}"
 
-    p = 54063578048409176568533461320397553485
-    q = 47877612267730623898736480941623668309
+    p = 54063578048409176568533461320397553509
+    q = 47877612267730623898736480941623668339
     s = 128
     acc = Accumulator(n=10, p=p, q=q, security=s)
     assert acc.is_member(5,